@@ -11,6 +11,10 @@ binaries = []
 hiddenimports = [
     'streamlit',
     'langchain_ollama',
+    'ollama',
+    'httpx',
+    'opentelemetry.sdk.trace',
+    'opentelemetry.sdk.resources',
     'langchain_community',
     'langchain_core',
     'pdf2image',
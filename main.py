@@ -25,6 +25,13 @@ if __name__ == "__main__":
     else:
         app_path = os.path.join(os.path.dirname(__file__), "src", "ui.py")
 
+    # Load the chat model into Ollama before the first question
+    try:
+        from ollama_client import start_warmup
+        start_warmup()
+    except Exception as e:
+        print(f"Failed to start model warm-up: {e}")
+
     # Start background watcher agent
     try:
         from watcher import start_watcher
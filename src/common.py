@@ -10,6 +10,7 @@ from langchain_community.embeddings import SentenceTransformerEmbeddings
 
 # Constants
 CHROMA_PATH = "chroma_db"
+DOCSTORE_PATH = "docstore"
 DATA_PATH = "data"
 DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 DEFAULT_CHAT_MODEL = "llama3.2:3b"
@@ -94,6 +95,48 @@ def get_embedding_function(model_name: str = None):
     )
 
 
+def get_chunking_config(config: dict = None) -> dict:
+    """
+    Return the `chunking:` section of the configuration with defaults applied.
+    
+    Args:
+        config: Loaded configuration (loads config.yaml if not provided)
+        
+    Returns:
+        Dictionary with mode, chunk sizes and retrieval limits
+    """
+    if config is None:
+        config = load_config()
+    
+    chunking = {
+        "mode": "recursive",
+        "chunk_size": 800,
+        "chunk_overlap": 80,
+        "child_chunk_size": 400,
+        "child_chunk_overlap": 0,
+        "retrieval_k": 5,
+        "max_parents": 3,
+        "max_context_chars": 4000
+    }
+    chunking.update(config.get("chunking") or {})
+    return chunking
+
+
+def get_parent_docstore(persist_directory: str = DOCSTORE_PATH):
+    """
+    Open the docstore holding full page text for parent retrieval.
+    
+    Args:
+        persist_directory: Folder backing the docstore
+        
+    Returns:
+        Key-value store mapping parent IDs to Documents
+    """
+    from langchain.storage import LocalFileStore, create_kv_docstore
+    
+    return create_kv_docstore(LocalFileStore(persist_directory))
+
+
 def update_agent_status(status: str):
     """
     Update the agent status file.
@@ -1,10 +1,17 @@
 import os
 import sys
+import uuid
 from typing import List
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from common import CHROMA_PATH, DATA_PATH, get_resource_path, get_embedding_function, load_config
+from langchain_core.documents import Document
+from common import (
+    CHROMA_PATH, DATA_PATH, DOCSTORE_PATH, DEFAULT_VISION_MODEL, get_resource_path,
+    get_embedding_function, get_chunking_config, get_parent_docstore, load_config
+)
+from tracing import get_tracer
+from rasterize import count_pages, get_render_settings, plan_jobs, iter_rendered_pages
 
 
 def get_indexed_files(persist_directory: str) -> set:
@@ -29,38 +36,8 @@ def get_indexed_files(persist_directory: str) -> set:
         print(f"Error checking indexed files: {e}")
         return set()
 
-def load_documents(data_folder: str, progress_callback=None):
-    """Load PDFs and analyze them using vision model for richer extraction.
-    
-    Args:
-        data_folder: Path to folder containing PDFs
-        progress_callback: Optional callback function(current, total, message) for progress updates
-    """
-    from pdf2image import convert_from_path
-    from langchain_ollama import ChatOllama
-    from langchain_core.messages import HumanMessage
-    from langchain.schema import Document
-    from PIL import Image
-    import yaml
-    import base64
-    import io
-    
-    # Load config to get vision model
-    config_path = os.path.join(os.getcwd(), "config.yaml")
-    vision_model = "qwen3-vl:4b"  # default
-    
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                if config and 'vision_model' in config:
-                    vision_model = config['vision_model']
-        except Exception as e:
-            print(f"Error loading config: {e}")
-    
-    print(f"Using vision model: {vision_model}")
-    
-    documents = []
+def find_new_pdf_files(data_folder: str, progress_callback=None) -> List[str]:
+    """List PDFs in the data folder that are not yet in the vector database."""
     if not os.path.exists(data_folder):
         os.makedirs(data_folder)
         print(f"Created data folder at {data_folder}")
@@ -83,11 +60,35 @@ def load_documents(data_folder: str, progress_callback=None):
         return []
     
     print(f"Found {len(pdf_files)} new files to index out of {len(all_pdf_files)} total.")
+    return pdf_files
+
+def load_documents(data_folder: str, progress_callback=None, pdf_files: List[str] = None):
+    """Load PDFs and analyze them using vision model for richer extraction.
+    
+    Args:
+        data_folder: Path to folder containing PDFs
+        progress_callback: Optional callback function(current, total, message) for progress updates
+        pdf_files: New PDFs to process (found with find_new_pdf_files if not provided)
+    """
+    from ollama_client import invoke_model
+    from langchain_core.messages import HumanMessage
+    from PIL import Image
+    import base64
+    import io
     
-    # Initialize vision model
-    llm = ChatOllama(model=vision_model)
+    # Load config to get vision model and rendering settings
+    config = load_config()
+    vision_model = config.get("vision_model", DEFAULT_VISION_MODEL)
     
-    # Calculate total pages for progress tracking
+    print(f"Using vision model: {vision_model}")
+    
+    documents = []
+    if pdf_files is None:
+        pdf_files = find_new_pdf_files(data_folder, progress_callback=progress_callback)
+    if not pdf_files:
+        return []
+    
+    # Read page counts from PDF headers for progress tracking
     total_pages = 0
     file_page_counts = {}
     
@@ -97,55 +98,77 @@ def load_documents(data_folder: str, progress_callback=None):
     for filename in pdf_files:
         file_path = os.path.join(data_folder, filename)
         try:
-            images = convert_from_path(file_path, dpi=300)
-            file_page_counts[filename] = len(images)
-            total_pages += len(images)
+            file_page_counts[filename] = count_pages(file_path)
+            total_pages += file_page_counts[filename]
         except Exception as e:
             print(f"Error reading {filename}: {e}")
     
+    # Render pages from all PDFs in parallel and analyze them as they arrive
+    render_settings = get_render_settings(config)
+    jobs = plan_jobs(file_page_counts, data_folder, render_settings["pages_per_task"])
+    print(f"Rendering {total_pages} pages with {render_settings['render_workers']} workers...")
+    
     current_page = 0
+    failed_pages = 0
+    render_failed_files = set()
+    current_file = None
+    tracer = get_tracer()
     
-    for filename in pdf_files:
-        file_path = os.path.join(data_folder, filename)
-        print(f"Loading {filename}...")
-        
-        if progress_callback:
-            progress_callback(current_page, total_pages, f"Processing {filename}...")
-        
-        try:
-
-            # Convert PDF pages to images
-            print(f"  Converting PDF to images...")
-            images = convert_from_path(file_path, dpi=300)  # Increased to 300 for high quality
+    try:
+        for filename, page_num, image_path in iter_rendered_pages(jobs, render_settings):
+            page_count = file_page_counts.get(filename, 0)
             
-            # Process each page with vision model
-            for page_num, image in enumerate(images, start=1):
-                print(f"  Analyzing page {page_num}/{len(images)} with {vision_model}...")
-                
+            if filename != current_file:
+                current_file = filename
+                print(f"Loading {filename}...")
                 if progress_callback:
-                    progress_callback(
-                        current_page, 
-                        total_pages, 
-                        f"Analyzing {filename} - Page {page_num}/{len(images)}"
-                    )
-                
-                # Try with PNG first, then JPEG with compression if it fails
-                for attempt in range(2):
-                    try:
-                        # Convert PIL Image to base64
-                        buffered = io.BytesIO()
-                        if attempt == 0:
-                            # First attempt: PNG (High Quality)
-                            image.save(buffered, format="PNG")
-                        else:
-                            # Second attempt: JPEG with compression (fallback)
-                            print(f"    Retrying with compressed JPEG...")
-                            image.save(buffered, format="JPEG", quality=85) # Increased quality for fallback too
-                        
-                        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-                        
-                        # Create embedding-optimized prompt with diverse sentence structures
-                        prompt = f"""You are a technical document analyst transforming page {page_num} of "{filename}" into embedding-optimized text.
+                    progress_callback(current_page, total_pages, f"Processing {filename}...")
+            
+            if image_path is None:
+                # Page could not be rendered (already reported by the rasterizer)
+                failed_pages += 1
+                render_failed_files.add(filename)
+                current_page += 1
+                continue
+            
+            # Handle errors per page so one bad page cannot abort the remaining files
+            try:
+                with tracer.start_as_current_span("ingest.analyze_page") as page_span:
+                    page_span.set_attribute("ingest.source", filename)
+                    page_span.set_attribute("ingest.page", page_num)
+                    page_span.set_attribute("llm.model", vision_model)
+                    print(f"  Analyzing page {page_num}/{page_count} with {vision_model}...")
+                    
+                    if progress_callback:
+                        progress_callback(
+                            current_page, 
+                            total_pages, 
+                            f"Analyzing {filename} - Page {page_num}/{page_count}"
+                        )
+                    
+                    # Try with PNG first, then JPEG with compression if it fails
+                    for attempt in range(2):
+                        try:
+                            if attempt == 0:
+                                # First attempt: the rendered PNG as-is (High Quality, no re-encode)
+                                with open(image_path, "rb") as f:
+                                    image_bytes = f.read()
+                                mime_type = "image/png"
+                            else:
+                                # Second attempt: JPEG with compression (fallback)
+                                print(f"    Retrying with compressed JPEG...")
+                                buffered = io.BytesIO()
+                                with Image.open(image_path) as image:
+                                    image.convert("RGB").save(buffered, format="JPEG", quality=85) # Increased quality for fallback too
+                                image_bytes = buffered.getvalue()
+                                mime_type = "image/jpeg"
+                            
+                            img_base64 = base64.b64encode(image_bytes).decode()
+                            page_span.set_attribute("ingest.attempt", attempt + 1)
+                            page_span.set_attribute("ingest.payload_bytes", len(img_base64))
+                            
+                            # Create embedding-optimized prompt with diverse sentence structures
+                            prompt = f"""You are a technical document analyst transforming page {page_num} of "{filename}" into embedding-optimized text.
 
 Your goal is to create semantically rich content using DIVERSE sentence structures that preserve all information while maximizing search relevance.
 
@@ -238,67 +261,143 @@ Write a flowing narrative using complete, varied sentences. Each sentence should
 
 Ignore decorative elements (logos, borders, watermarks)."""
 
-                        # Analyze with vision model
-                        message = HumanMessage(
-                            content=[
-                                {"type": "text", "text": prompt},
-                                {"type": "image_url", "image_url": f"data:image/png;base64,{img_base64}"}
-                            ]
-                        )
-                        
-                        response = llm.invoke([message])
-                        extracted_content = response.content
-                        
-                        # Create document with extracted content
-                        doc = Document(
-                            page_content=extracted_content,
-                            metadata={
-                                "source": filename,
-                                "page": page_num,
-                                "total_pages": len(images)
-                            }
-                        )
-                        documents.append(doc)
-                        print(f"  ✓ Page {page_num} analyzed ({len(extracted_content)} chars)")
-                        
-                        # Success - break out of retry loop
-                        break
-                        
-                    except Exception as page_error:
-                        if attempt == 0:
-                            print(f"    Error on attempt {attempt + 1}: {page_error}")
-                            print(f"    Will retry with compressed image...")
-                            continue
-                        else:
-                            # Both attempts failed
-                            print(f"  ✗ Failed to analyze page {page_num} after {attempt + 1} attempts: {page_error}")
-                            # Continue to next page instead of crashing
+                            # Analyze with vision model
+                            message = HumanMessage(
+                                content=[
+                                    {"type": "text", "text": prompt},
+                                    {"type": "image_url", "image_url": f"data:{mime_type};base64,{img_base64}"}
+                                ]
+                            )
+                            
+                            response = invoke_model(vision_model, [message])
+                            extracted_content = response.content
+                            
+                            # Create document with extracted content
+                            doc = Document(
+                                page_content=extracted_content,
+                                metadata={
+                                    "source": filename,
+                                    "page": page_num,
+                                    "total_pages": page_count
+                                }
+                            )
+                            documents.append(doc)
+                            page_span.set_attribute("ingest.output_chars", len(extracted_content))
+                            print(f"  ✓ Page {page_num} analyzed ({len(extracted_content)} chars)")
+                            
+                            # Success - break out of retry loop
                             break
-                
-                current_page += 1
-                
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
-            import traceback
-            traceback.print_exc()
+                            
+                        except Exception as page_error:
+                            if attempt == 0:
+                                print(f"    Error on attempt {attempt + 1}: {page_error}")
+                                print(f"    Will retry with compressed image...")
+                                continue
+                            else:
+                                # Both attempts failed
+                                failed_pages += 1
+                                print(f"  ✗ Failed to analyze page {page_num} after {attempt + 1} attempts: {page_error}")
+                                # Continue to next page instead of crashing
+                                break
+            except Exception as e:
+                failed_pages += 1
+                print(f"  ✗ Error processing {filename} page {page_num}: {e}")
+                import traceback
+                traceback.print_exc()
+            
+            current_page += 1
+            
+    except Exception as e:
+        print(f"Error processing documents: {e}")
+        import traceback
+        traceback.print_exc()
+    
+    # Leave files with unrendered pages out of the index so the next sync retries them
+    if render_failed_files:
+        documents = [doc for doc in documents if doc.metadata["source"] not in render_failed_files]
+        for filename in sorted(render_failed_files):
+            print(f"Skipping {filename}: some pages could not be rendered, will retry on next sync.")
     
-    print(f"Total documents extracted: {len(documents)}")
+    print(f"Total documents extracted: {len(documents)} ({failed_pages} of {total_pages} pages failed)")
     
     if progress_callback:
         progress_callback(total_pages, total_pages, "Analysis complete!")
     
     return documents
 
+# Boundaries tried in order by the structured splitter: paragraphs, numbered
+# sections/requirements ("3.2.1 ...", "REQ-12 ...", "1) ..."), list items, lines, sentences
+STRUCTURED_SEPARATORS = [
+    r"\n\s*\n",
+    r"\n(?=\s*(?:\d+(?:\.\d+)+|[A-Z]{2,}[-_]?\d+|\d+[.)])\s)",
+    r"\n(?=\s*[-*•]\s)",
+    r"\n",
+    r"(?<=[.!?;:])\s+",
+    r"\s+",
+]
+
+
+def get_parent_id(doc) -> str:
+    """Stable docstore key for a page, so re-indexing a file overwrites its parents."""
+    key = f"{doc.metadata.get('source')}:{doc.metadata.get('page')}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
 def split_text(documents: List):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=80,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    chunks = text_splitter.split_documents(documents)
+    """Split page documents into chunks for embedding.
+    
+    In "structured" chunking mode each page becomes a parent and is split into
+    small child chunks along paragraph, requirement and sentence boundaries.
+    Children carry the parent's ID in their metadata so retrieval can return
+    the full page text. The input documents are not modified.
+    
+    Returns:
+        Tuple of (chunks, parents); parents is empty in "recursive" mode
+    """
+    chunking = get_chunking_config()
+    
+    with get_tracer().start_as_current_span("ingest.split_text") as span:
+        span.set_attribute("ingest.chunking_mode", chunking["mode"])
+        span.set_attribute("ingest.documents", len(documents))
+        
+        if chunking["mode"] == "structured":
+            text_splitter = RecursiveCharacterTextSplitter(
+                separators=STRUCTURED_SEPARATORS,
+                chunk_size=chunking["child_chunk_size"],
+                chunk_overlap=chunking["child_chunk_overlap"],
+                length_function=len,
+                is_separator_regex=True,
+            )
+            parents = [
+                Document(
+                    page_content=doc.page_content,
+                    metadata={**doc.metadata, "parent_id": get_parent_id(doc)}
+                )
+                for doc in documents
+            ]
+            chunks = text_splitter.split_documents(parents)
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunking["chunk_size"],
+                chunk_overlap=chunking["chunk_overlap"],
+                length_function=len,
+                is_separator_regex=False,
+            )
+            parents = []
+            chunks = text_splitter.split_documents(documents)
+        span.set_attribute("ingest.chunks", len(chunks))
+    
     print(f"Split {len(documents)} documents into {len(chunks)} chunks.")
-    return chunks
+    return chunks, parents
+
+def save_parent_documents(parents: List, persist_directory: str):
+    """Store full page documents (from split_text) that child chunks point back to."""
+    if not parents:
+        return
+    
+    docstore = get_parent_docstore(persist_directory)
+    docstore.mset([(doc.metadata["parent_id"], doc) for doc in parents])
+    print(f"Saved {len(parents)} parent pages to {persist_directory}.")
 
 def save_to_chroma(chunks: List, persist_directory: str):
     """Save chunks to ChromaDB with incremental updates."""
@@ -306,32 +405,47 @@ def save_to_chroma(chunks: List, persist_directory: str):
     if not os.path.exists(persist_directory):
         os.makedirs(persist_directory)
 
-    # Use common embedding function
-    embedding_function = get_embedding_function()
+    tracer = get_tracer()
+    with tracer.start_as_current_span("ingest.save_to_chroma") as span:
+        span.set_attribute("ingest.chunks", len(chunks))
+        span.set_attribute("ingest.chunk_chars", sum(len(chunk.page_content) for chunk in chunks))
+
+        # Use common embedding function
+        with tracer.start_as_current_span("ingest.load_embedder"):
+            embedding_function = get_embedding_function()
 
-    # Create or update DB from documents
-    db = Chroma.from_documents(
-        documents=chunks, 
-        embedding=embedding_function, 
-        persist_directory=persist_directory
-    )
+        # Create or update DB from documents
+        db = Chroma.from_documents(
+            documents=chunks, 
+            embedding=embedding_function, 
+            persist_directory=persist_directory
+        )
     print(f"Saved {len(chunks)} chunks to {persist_directory}.")
 
 def ingest(data_folder: str = DATA_PATH, progress_callback=None):
-    documents = load_documents(data_folder, progress_callback=progress_callback)
-    if not documents:
+    pdf_files = find_new_pdf_files(data_folder, progress_callback=progress_callback)
+    if not pdf_files:
         print("No documents found.")
         return
     
-    if progress_callback:
-        progress_callback(0, 100, "Splitting documents into chunks...")
-    
-    chunks = split_text(documents)
-    
-    if progress_callback:
-        progress_callback(0, 100, "Creating embeddings and saving to database...")
-    
-    save_to_chroma(chunks, CHROMA_PATH)
+    # Only runs with new files are traced, so idle watcher polls add no spans
+    with get_tracer().start_as_current_span("ingest.run") as span:
+        span.set_attribute("ingest.files", len(pdf_files))
+        documents = load_documents(data_folder, progress_callback=progress_callback, pdf_files=pdf_files)
+        if not documents:
+            print("No documents found.")
+            return
+        
+        if progress_callback:
+            progress_callback(0, 100, "Splitting documents into chunks...")
+        
+        chunks, parents = split_text(documents)
+        
+        if progress_callback:
+            progress_callback(0, 100, "Creating embeddings and saving to database...")
+        
+        save_parent_documents(parents, DOCSTORE_PATH)
+        save_to_chroma(chunks, CHROMA_PATH)
 
 if __name__ == "__main__":
     ingest()
@@ -0,0 +1,280 @@
+"""
+Shared Ollama client layer.
+Keeps one pooled ChatOllama per model, controls model residency via keep_alive,
+warms the chat model at startup and serializes model switches on a single device.
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager
+import httpx
+import ollama
+from langchain_ollama import ChatOllama
+from common import load_config, DEFAULT_CHAT_MODEL
+from tracing import get_tracer
+
+# Defaults (overridable under the `ollama:` section of config.yaml)
+DEFAULT_BASE_URL = "http://localhost:11434"
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_MAX_CONNECTIONS = 4
+
+_clients = {}
+_clients_lock = threading.Lock()
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def get_ollama_config(config: dict = None) -> dict:
+    """
+    Return the `ollama:` section of the configuration with defaults applied.
+
+    Args:
+        config: Loaded configuration (loads config.yaml if not provided)
+
+    Returns:
+        Dictionary with base_url, keep_alive, max_connections, warmup and exclusive_models
+    """
+    if config is None:
+        config = load_config()
+
+    settings = {
+        "base_url": DEFAULT_BASE_URL,
+        "default_keep_alive": DEFAULT_KEEP_ALIVE,
+        "keep_alive": {},
+        "max_connections": DEFAULT_MAX_CONNECTIONS,
+        "warmup": True,
+        "exclusive_models": True
+    }
+    settings.update(config.get("ollama") or {})
+    return settings
+
+
+def get_keep_alive(model: str, config: dict = None):
+    """
+    Resolve how long Ollama should keep a model resident after a request.
+
+    Args:
+        model: Ollama model name
+        config: Loaded configuration (loads config.yaml if not provided)
+
+    Returns:
+        Duration string (e.g. "30m"), seconds as int, or -1 to keep loaded forever
+    """
+    settings = get_ollama_config(config)
+    per_model = settings.get("keep_alive") or {}
+    return per_model.get(model, settings["default_keep_alive"])
+
+
+def get_connection(config: dict = None):
+    """
+    Return the shared connection to the Ollama endpoint.
+
+    One httpx transport (and so one pool of keep-alive connections) is shared
+    by the ollama.Client returned here and by every ChatOllama from
+    get_chat_client(). It is rebuilt when base_url or max_connections change.
+
+    Args:
+        config: Loaded configuration (loads config.yaml if not provided)
+
+    Returns:
+        Tuple of (httpx.HTTPTransport, ollama.Client)
+    """
+    global _connection
+
+    settings = get_ollama_config(config)
+    max_connections = settings["max_connections"]
+    connection_key = (settings["base_url"], max_connections)
+
+    with _connection_lock:
+        if _connection is None or _connection[0] != connection_key:
+            transport = httpx.HTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                )
+            )
+            client = ollama.Client(host=settings["base_url"], transport=transport)
+            _connection = (connection_key, transport, client)
+        return _connection[1], _connection[2]
+
+
+def get_chat_client(model: str, config: dict = None) -> ChatOllama:
+    """
+    Return the shared ChatOllama instance for a model.
+
+    Instances are cached per model and send their requests through the shared
+    connection pool from get_connection(). A cached client is replaced when
+    its base_url, keep_alive or max_connections change in config.yaml, so
+    edits apply on the next request without a restart.
+
+    Args:
+        model: Ollama model name
+        config: Loaded configuration (loads config.yaml if not provided)
+
+    Returns:
+        ChatOllama instance bound to the configured endpoint
+    """
+    settings = get_ollama_config(config)
+    keep_alive = get_keep_alive(model, config)
+    transport, _ollama_client = get_connection(config)
+    client_key = (settings["base_url"], keep_alive, transport)
+
+    with _clients_lock:
+        cached_key, client = _clients.get(model, (None, None))
+        if client is None or cached_key != client_key:
+            client = ChatOllama(
+                model=model,
+                base_url=settings["base_url"],
+                keep_alive=keep_alive,
+                sync_client_kwargs={"transport": transport}
+            )
+            _clients[model] = (client_key, client)
+        return client
+
+
+class ModelScheduler:
+    """
+    Serializes access to Ollama models on a single GPU/CPU host.
+
+    Any number of callers may use the currently loaded model concurrently.
+    A caller asking for a different model waits until in-flight requests on the
+    current model drain. When the scheduler switches to a model, every request
+    for it that was already queued is admitted as one batch; requests for the
+    current model that arrive while another model is waiting (including the
+    caller that just released the slot) are held back until the next switch.
+    Each switch therefore serves a whole queue, so overlapping ingestion and
+    chat swap models once per batch instead of once per request, and neither
+    workload can starve the other.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._current = None
+        self._active = 0
+        self._waiting = {}
+        self._next_ticket = 0
+        self._batch_cutoff = 0
+
+    def _others_waiting(self, model: str) -> bool:
+        return any(count for name, count in self._waiting.items() if name != model)
+
+    def _can_enter(self, model: str, ticket: int) -> bool:
+        if self._current != model:
+            return self._active == 0
+        # Queued before the switch to this model: part of the current batch
+        if ticket < self._batch_cutoff:
+            return True
+        return not self._others_waiting(model)
+
+    @contextmanager
+    def use(self, model: str):
+        """Context manager that holds a slot on `model` for one request."""
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._waiting[model] = self._waiting.get(model, 0) + 1
+            try:
+                while not self._can_enter(model, ticket):
+                    self._cond.wait()
+            finally:
+                self._waiting[model] -= 1
+            if self._current != model:
+                # Switch models and admit everything already queued for this one
+                self._current = model
+                self._batch_cutoff = self._next_ticket
+                self._cond.notify_all()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+
+_scheduler = ModelScheduler()
+
+
+@contextmanager
+def model_slot(model: str, config: dict = None):
+    """
+    Hold the model scheduler for one Ollama request.
+
+    A no-op when `ollama.exclusive_models` is disabled (e.g. hosts with enough
+    memory to keep both the vision and chat models resident).
+
+    Args:
+        model: Ollama model name about to be invoked
+        config: Loaded configuration (loads config.yaml if not provided)
+    """
+    if not get_ollama_config(config)["exclusive_models"]:
+        yield
+        return
+    with _scheduler.use(model):
+        yield
+
+
+def invoke_model(model: str, messages, config: dict = None):
+    """
+    Invoke a model through its shared client while holding its scheduler slot.
+
+    Args:
+        model: Ollama model name
+        messages: Prompt string or list of messages passed to ChatOllama.invoke
+        config: Loaded configuration (loads config.yaml if not provided)
+
+    Returns:
+        The model response message
+    """
+    tracer = get_tracer()
+    client = get_chat_client(model, config)
+    with tracer.start_as_current_span("ollama.invoke") as span:
+        span.set_attribute("llm.model", model)
+        with ExitStack() as stack:
+            # Time spent queued behind another model on the scheduler
+            with tracer.start_as_current_span("ollama.wait_for_model"):
+                stack.enter_context(model_slot(model, config))
+            response = client.invoke(messages)
+
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage:
+            span.set_attribute("llm.prompt_tokens", usage.get("input_tokens", 0))
+            span.set_attribute("llm.completion_tokens", usage.get("output_tokens", 0))
+        return response
+
+
+def warm_up_models(config: dict = None):
+    """
+    Load the chat model into Ollama ahead of the first question.
+
+    Sends an empty generate request through the shared connection pool, which
+    makes Ollama load the model and keep it resident for the configured
+    keep_alive without producing any tokens.
+
+    Args:
+        config: Loaded configuration (loads config.yaml if not provided)
+    """
+    if config is None:
+        config = load_config()
+    settings = get_ollama_config(config)
+    if not settings["warmup"]:
+        return
+
+    chat_model = config.get("chat_model", DEFAULT_CHAT_MODEL)
+    try:
+        _transport, client = get_connection(config)
+        with model_slot(chat_model, config):
+            client.generate(
+                model=chat_model,
+                prompt="",
+                keep_alive=get_keep_alive(chat_model, config)
+            )
+        print(f"Warmed up chat model: {chat_model}")
+    except Exception as e:
+        print(f"Failed to warm up {chat_model}: {e}")
+
+
+def start_warmup():
+    """Warm up models in a background thread so startup is not blocked."""
+    thread = threading.Thread(target=warm_up_models, daemon=True)
+    thread.start()
+    return thread
@@ -1,33 +1,14 @@
 from langchain_chroma import Chroma
-from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
-from common import CHROMA_PATH, load_config, get_embedding_function
+from common import CHROMA_PATH, DOCSTORE_PATH, load_config, get_embedding_function, get_chunking_config, get_parent_docstore
+from ollama_client import invoke_model
+from tracing import get_tracer
 
 # Load configuration
 config = load_config()
 CHAT_MODEL = config.get("chat_model", "llama3.2:3b")
 
-
-
-def query_rag(query_text: str, ollama_model: str = CHAT_MODEL):
-    embedding_function = get_embedding_function()
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-
-    # Search the DB.
-    results = db.similarity_search_with_score(query_text, k=5)
-
-    # Check if we have any results
-    if not results or len(results) == 0:
-        # No documents in database - use Ollama directly without RAG
-        print("Warning: No documents found in database. Using Ollama without context.")
-        model = ChatOllama(model=ollama_model)
-        response_text = model.invoke(query_text)
-        return response_text, ["No documents indexed yet. Please add PDFs to the data/ folder and click 'Re-index Documents'."], ""
-    
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    
-    prompt_template = ChatPromptTemplate.from_template(
-        """
+PROMPT_TEMPLATE = """
         Answer the question based only on the following context:
 
         {context}
@@ -36,16 +17,110 @@ def query_rag(query_text: str, ollama_model: str = CHAT_MODEL):
 
         Answer the question based on the above context: {question}
         """
-    )
+
+
+def get_parent_documents(results, max_parents: int, max_context_chars: int):
+    """
+    Replace matched child chunks with their deduplicated parent pages.
     
-    prompt = prompt_template.format(context=context_text, question=query_text)
+    Parents are taken in order of their best-scoring child until `max_parents`
+    documents or `max_context_chars` characters of context are reached. When a
+    parent page does not fit in the remaining budget, the matched child is used
+    instead. Chunks indexed without a parent (e.g. by the "recursive" chunking
+    mode) are kept as-is.
     
-    model = ChatOllama(model=ollama_model)
-    response_text = model.invoke(prompt)
-
-    sources = [doc.metadata.get("source", None) for doc, _score in results]
+    Args:
+        results: (document, score) pairs from the vector search
+        max_parents: Maximum number of documents to return
+        max_context_chars: Maximum total characters of the returned documents
+        
+    Returns:
+        List of Documents to use as context
+    """
+    wanted = []
+    for doc, _score in results:
+        parent_id = doc.metadata.get("parent_id")
+        if parent_id is not None and parent_id not in wanted:
+            wanted.append(parent_id)
+    parents = dict(zip(wanted, get_parent_docstore(DOCSTORE_PATH).mget(wanted))) if wanted else {}
+    
+    documents = []
+    seen = set()
+    context_chars = 0
+    for doc, _score in results:
+        parent = parents.get(doc.metadata.get("parent_id"))
+        for candidate in (parent, doc):
+            if candidate is None:
+                continue
+            key = (candidate.metadata.get("parent_id"), candidate.page_content if candidate is doc else None)
+            if key in seen:
+                break
+            if context_chars + len(candidate.page_content) <= max_context_chars:
+                seen.add(key)
+                documents.append(candidate)
+                context_chars += len(candidate.page_content)
+                break
+        if len(documents) >= max_parents:
+            break
     
-    return response_text, sources, context_text
+    # Always answer from something, even if the best match alone exceeds the budget
+    if not documents and results:
+        documents.append(results[0][0])
+    return documents
+
+
+def query_rag(query_text: str, ollama_model: str = CHAT_MODEL):
+    tracer = get_tracer()
+    with tracer.start_as_current_span("rag.query") as query_span:
+        query_span.set_attribute("llm.model", ollama_model)
+        query_span.set_attribute("rag.question_chars", len(query_text))
+
+        with tracer.start_as_current_span("rag.load_embedder"):
+            embedding_function = get_embedding_function()
+
+        with tracer.start_as_current_span("rag.open_chroma"):
+            db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+
+        # Read config.yaml on each query so retrieval follows the mode ingestion uses
+        chunking = get_chunking_config()
+
+        # Search the DB.
+        with tracer.start_as_current_span("rag.vector_search") as span:
+            span.set_attribute("rag.k", chunking["retrieval_k"])
+            results = db.similarity_search_with_score(query_text, k=chunking["retrieval_k"])
+            span.set_attribute("rag.results", len(results))
+
+        # Check if we have any results
+        if not results or len(results) == 0:
+            # No documents in database - use Ollama directly without RAG
+            print("Warning: No documents found in database. Using Ollama without context.")
+            response_text = invoke_model(ollama_model, query_text)
+            return response_text, ["No documents indexed yet. Please add PDFs to the data/ folder and click 'Re-index Documents'."], ""
+        
+        # Structured chunks match on small children but answer from their parent pages
+        if chunking["mode"] == "structured":
+            with tracer.start_as_current_span("rag.expand_parents") as span:
+                documents = get_parent_documents(
+                    results, chunking["max_parents"], chunking["max_context_chars"]
+                )
+                span.set_attribute("rag.parents", len(documents))
+                span.set_attribute("rag.context_chars", sum(len(doc.page_content) for doc in documents))
+        else:
+            documents = [doc for doc, _score in results]
+        
+        with tracer.start_as_current_span("rag.format_prompt") as span:
+            context_text = "\n\n---\n\n".join([doc.page_content for doc in documents])
+            
+            prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+            prompt = prompt_template.format(context=context_text, question=query_text)
+            span.set_attribute("rag.context_documents", len(documents))
+            span.set_attribute("rag.prompt_chars", len(prompt))
+        
+        response_text = invoke_model(ollama_model, prompt)
+
+        sources = [doc.metadata.get("source", None) for doc in documents]
+        
+        return response_text, sources, context_text
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,141 @@
+"""
+Parallel PDF rasterization.
+Renders page ranges from many PDFs concurrently, spilling PNG files to disk,
+and yields them to the vision stage through a bounded window of in-flight jobs.
+Each job runs poppler's pdftoppm as a subprocess, so a thread pool is enough to
+keep every core busy.
+"""
+
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+
+# Defaults (overridable under the `ingest:` section of config.yaml)
+DEFAULT_DPI = 300
+DEFAULT_PAGES_PER_TASK = 4
+
+
+def get_render_settings(config: dict) -> dict:
+    """
+    Return the `ingest:` section of the configuration with defaults applied.
+
+    Args:
+        config: Loaded configuration
+
+    Returns:
+        Dictionary with dpi, render_workers, pages_per_task, max_pending_tasks and spill_dir
+    """
+    settings = {
+        "dpi": DEFAULT_DPI,
+        "render_workers": 0,
+        "pages_per_task": DEFAULT_PAGES_PER_TASK,
+        "max_pending_tasks": 0,
+        "spill_dir": None
+    }
+    settings.update(config.get("ingest") or {})
+
+    if not settings["render_workers"]:
+        settings["render_workers"] = os.cpu_count() or 1
+    if not settings["max_pending_tasks"]:
+        settings["max_pending_tasks"] = settings["render_workers"] * 2
+    return settings
+
+
+def count_pages(file_path: str) -> int:
+    """Read the page count from the PDF header without rendering it."""
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(file_path)["Pages"])
+
+
+def plan_jobs(page_counts: dict, data_folder: str, pages_per_task: int) -> List[Tuple[str, str, int, int]]:
+    """
+    Split every PDF into page ranges that can be rendered independently.
+
+    Args:
+        page_counts: Mapping of filename to number of pages
+        data_folder: Folder containing the PDFs
+        pages_per_task: Maximum number of pages rendered by one worker task
+
+    Returns:
+        List of (filename, file_path, first_page, last_page) jobs in document order
+    """
+    jobs = []
+    for filename, pages in page_counts.items():
+        file_path = os.path.join(data_folder, filename)
+        for first_page in range(1, pages + 1, pages_per_task):
+            last_page = min(first_page + pages_per_task - 1, pages)
+            jobs.append((filename, file_path, first_page, last_page))
+    return jobs
+
+
+def render_pages(file_path: str, first_page: int, last_page: int, dpi: int, output_folder: str) -> List[str]:
+    """
+    Render a page range to PNG files (runs on a worker thread).
+
+    Returns:
+        Paths of the rendered pages, in page order
+    """
+    from pdf2image import convert_from_path
+
+    prefix = f"{os.path.splitext(os.path.basename(file_path))[0]}_{first_page:05d}"
+    return convert_from_path(
+        file_path,
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        fmt="png",
+        output_folder=output_folder,
+        output_file=prefix,
+        paths_only=True
+    )
+
+
+def iter_rendered_pages(jobs: List[Tuple[str, str, int, int]], settings: dict) -> Iterator[Tuple[str, int, str]]:
+    """
+    Render jobs in a thread pool and yield pages in document order.
+
+    At most `max_pending_tasks` jobs are in flight, so rendering runs ahead of the
+    vision stage without filling the spill directory. Each page file is deleted
+    once the consumer moves on to the next page.
+
+    Args:
+        jobs: Jobs from plan_jobs()
+        settings: Settings from get_render_settings()
+
+    Yields:
+        (filename, page_num, image_path) for each page; image_path is None when
+        the page could not be rendered
+    """
+    spill_dir = tempfile.mkdtemp(prefix="req_analyzer_pages_", dir=settings["spill_dir"])
+    pending = deque()
+    remaining = deque(jobs)
+
+    try:
+        with ThreadPoolExecutor(max_workers=settings["render_workers"], thread_name_prefix="render") as pool:
+            while remaining or pending:
+                while remaining and len(pending) < settings["max_pending_tasks"]:
+                    job = remaining.popleft()
+                    filename, file_path, first_page, last_page = job
+                    future = pool.submit(render_pages, file_path, first_page, last_page, settings["dpi"], spill_dir)
+                    pending.append((job, future))
+
+                (filename, _file_path, first_page, last_page), future = pending.popleft()
+                try:
+                    image_paths = future.result()
+                except Exception as e:
+                    print(f"Error rendering {filename} pages {first_page}-{last_page}: {e}")
+                    for page_num in range(first_page, last_page + 1):
+                        yield filename, page_num, None
+                    continue
+
+                for page_num, image_path in enumerate(image_paths, start=first_page):
+                    try:
+                        yield filename, page_num, image_path
+                    finally:
+                        if os.path.exists(image_path):
+                            os.remove(image_path)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
@@ -0,0 +1,137 @@
+"""
+Summarize spans written by the file exporter (see tracing.py).
+Prints a per-stage latency breakdown for each kind of root span, e.g. rag.query
+and ingest.run.
+
+Usage:
+    python src/trace_summary.py [traces.jsonl] [--root rag.query]
+"""
+
+import argparse
+import datetime
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+
+def parse_time(value: str) -> float:
+    """Convert an exported ISO timestamp to seconds since the epoch."""
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def load_spans(path: str) -> List[dict]:
+    """Read one JSON span per line, skipping lines that are not valid spans."""
+    spans = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                span = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            spans.append({
+                "name": span["name"],
+                "span_id": span["context"]["span_id"],
+                "parent_id": span.get("parent_id"),
+                "duration_ms": (parse_time(span["end_time"]) - parse_time(span["start_time"])) * 1000,
+                "attributes": span.get("attributes") or {}
+            })
+    return spans
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def new_node() -> dict:
+    return {"durations": [], "children": {}}
+
+
+def summarize(spans: List[dict]) -> Dict[str, dict]:
+    """
+    Aggregate span durations by root span name and position in the span tree.
+
+    Stages are keyed by their path below the root, so a span nested in another
+    stage (e.g. ollama.invoke inside ingest.analyze_page) is counted under that
+    stage instead of alongside it.
+
+    Returns:
+        Mapping of root name to a tree of {"durations": [...], "children": {name: node}}
+    """
+    by_id = {span["span_id"]: span for span in spans}
+
+    def path_from_root(span):
+        names = []
+        while span["parent_id"] in by_id:
+            names.append(span["name"])
+            span = by_id[span["parent_id"]]
+        return span["name"], list(reversed(names))
+
+    summary = defaultdict(new_node)
+    for span in spans:
+        root_name, path = path_from_root(span)
+        node = summary[root_name]
+        for name in path:
+            node = node["children"].setdefault(name, new_node())
+        node["durations"].append(span["duration_ms"])
+    return summary
+
+
+def format_row(label: str, values: List[float], root_total: float) -> str:
+    share = 100 * sum(values) / root_total if root_total else 0
+    return (
+        f"  {label:<32}{len(values):>7}"
+        f"{sum(values) / len(values):>11.1f}"
+        f"{percentile(values, 0.5):>11.1f}"
+        f"{percentile(values, 0.95):>11.1f}"
+        f"{max(values):>11.1f}"
+        f"{share:>7.1f}%"
+    )
+
+
+def print_stages(children: Dict[str, dict], root_total: float, depth: int = 0):
+    """Print stages sorted by total time, with nested stages indented below their parent."""
+    stages = sorted(children.items(), key=lambda item: sum(item[1]["durations"]), reverse=True)
+    for stage_name, node in stages:
+        if node["durations"]:
+            print(format_row("  " * depth + stage_name, node["durations"], root_total))
+        print_stages(node["children"], root_total, depth + 1)
+
+
+def print_summary(summary: Dict[str, dict], root_filter: str = None):
+    """
+    Print a latency breakdown per root span.
+
+    Top-level stages add up to the root time together with "(untraced)", the
+    time spent in the root outside any stage. Indented rows are part of the
+    stage above them.
+    """
+    header = f"  {'stage':<32}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}{'% root':>8}"
+    for root_name, root in sorted(summary.items()):
+        if root_filter and root_name != root_filter:
+            continue
+        durations = root["durations"]
+        if not durations:
+            continue
+        root_total = sum(durations)
+        print(f"\n{root_name}: {len(durations)} trace(s), mean {root_total / len(durations):.1f} ms")
+        print(header)
+        print_stages(root["children"], root_total)
+
+        staged = sum(sum(node["durations"]) for node in root["children"].values())
+        untraced = max(root_total - staged, 0.0)
+        print(f"  {'(untraced)':<32}{'':>7}{untraced / len(durations):>11.1f}{'':>33}{100 * untraced / root_total:>7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency breakdown from exported traces")
+    parser.add_argument("path", nargs="?", default="traces.jsonl", help="Trace file written by the file exporter")
+    parser.add_argument("--root", help="Only show traces whose root span has this name (e.g. rag.query)")
+    args = parser.parse_args()
+
+    print_summary(summarize(load_spans(args.path)), args.root)
@@ -0,0 +1,82 @@
+"""
+Opt-in OpenTelemetry tracing.
+Spans are exported to the console or a local JSON-lines file without an external
+collector. When tracing is disabled, the OpenTelemetry API's default no-op tracer
+is used, so instrumented code pays almost nothing.
+"""
+
+import os
+import threading
+from opentelemetry import trace
+from common import load_config
+
+TRACER_NAME = "req_analyzer"
+DEFAULT_TRACE_FILE = "traces.jsonl"
+
+_setup_lock = threading.Lock()
+_setup_done = False
+
+
+def get_tracing_config(config: dict = None) -> dict:
+    """
+    Return the `tracing:` section of the configuration with defaults applied.
+
+    Args:
+        config: Loaded configuration (loads config.yaml if not provided)
+
+    Returns:
+        Dictionary with enabled, exporter ("file" or "console") and file
+    """
+    if config is None:
+        config = load_config()
+
+    settings = {
+        "enabled": False,
+        "exporter": "file",
+        "file": DEFAULT_TRACE_FILE
+    }
+    settings.update(config.get("tracing") or {})
+    return settings
+
+
+def setup_tracing(config: dict = None):
+    """
+    Install an SDK tracer provider if tracing is enabled (runs once per process).
+
+    Args:
+        config: Loaded configuration (loads config.yaml if not provided)
+    """
+    global _setup_done
+
+    with _setup_lock:
+        if _setup_done:
+            return
+        _setup_done = True
+
+        settings = get_tracing_config(config)
+        if not settings["enabled"]:
+            return
+
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if settings["exporter"] == "console":
+            exporter = ConsoleSpanExporter()
+        else:
+            trace_file = open(settings["file"], "a")
+            exporter = ConsoleSpanExporter(
+                out=trace_file,
+                formatter=lambda span: span.to_json(indent=None) + os.linesep
+            )
+
+        provider = TracerProvider(resource=Resource.create({"service.name": TRACER_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        print(f"Tracing enabled ({settings['exporter']} exporter)")
+
+
+def get_tracer():
+    """Return the application tracer, setting up the exporter on first use."""
+    setup_tracing()
+    return trace.get_tracer(TRACER_NAME)